@@ -2,15 +2,23 @@
 """
 Lucina Edition.docx to TEI XML converter - Final Version
 Fixes Praefatio headers, colophon handling, and lyric meter detection
+
+Usage: python docx-to-tei-xml.py Edition.docx [output.xml]
+
+Only lxml is needed (the .docx is read with zipfile), so the converter
+can also run under PyPy as `pypy3 docx-to-tei-xml.py ...`.
 """
 
 import re
 import logging
+import zipfile
 from pathlib import Path
-from docx import Document
+from xml.sax.saxutils import escape
 from lxml import etree
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from collections import defaultdict
+from itertools import zip_longest
+from operator import itemgetter
 
 # Configure logging
 logging.basicConfig(
@@ -19,41 +27,135 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Precompiled pattern - classifies paragraphs that pass _HEADER_FIRST_CHARS
+_HEADER_RE = re.compile(
+   # Colophon paragraphs (at end of document), by their opening words
+   r'(?P<colophon>Actum Papiae|CDiis Immor|Quarto Nonas Augustas)'
+   # Book headers
+   r'|(?P<book>(?:Praefatio|(?:Buch|B\[uch\])\s+(?P<book_num>[IVX]+))$)'
+   # Poem headers: "I, 5 Ad ..." / "I, 5 In ..." (invectives/epitaphs),
+   # "I, 5 Title" without preposition (Roman book numbers only) and
+   # numeric book numbers with Ad/In (if any)
+   r'|(?P<poem>(?:(?P<roman>[IVX]+)|(?P<digits>\d+)),\s*(?P<num>\d+)\s+'
+   r'(?:(?P<prep>Ad|In)\s+(?P<ded>.+?)|(?(roman)(?P<title>[A-Z][a-z].+?)|(?!)))\.?$)'
+)
+# Book numbering lookups
+_DIGIT_TO_ROMAN = {'1': 'I', '2': 'II', '3': 'III'}
+_BOOK_INDEX = {'I': '1', 'II': '2', 'III': '3'}  # also fixes the book order
+_ROMAN_TO_WORD = {'I': 'Primus', 'II': 'Secundus', 'III': 'Tertius'}
+# Known lyric poems (odd line counts or special meters)
+_LYRIC_POEMS = frozenset({
+   ('I', '18'),   # 3 lines
+   ('I', '43'),   # 84 lines (sapphic)
+   ('II', '6'),   # 51 lines
+   ('III', '1'),  # 29 lines
+   ('III', '10'), # 39 lines
+   ('III', '36'), # 29 lines (hexameter)
+   ('III', '43'), # 55 lines
+   ('III', '47'), # Multiple lines, lyric
+})
+# Colophon paragraphs start with A, C or Q, book headers with P(raefatio) or
+# B(uch), poem headers with a Roman or Arabic book number - anything else
+# cannot match _HEADER_RE
+_HEADER_FIRST_CHARS = frozenset('ACQPBIVX0123456789')
+# Rubric text that sometimes runs on after a poem's dedicatee (e.g. III, 1)
+_TRAILING_RUBRIC_RE = re.compile(r'Aurelius|Albrisii|incipit')
+
+# WordprocessingML, read straight from the .docx package
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_DOCUMENT_PART = 'word/document.xml'
+_W_BODY = f'{{{_W_NS}}}body'
+_W_P = f'{{{_W_NS}}}p'
+# Run content of a <w:p>, in the order python-docx's Paragraph.text reads it
+_RUN_CONTENT_XPATH = etree.XPath(
+   '(w:r | w:hyperlink/w:r)/*[self::w:t or self::w:tab or self::w:ptab'
+   ' or self::w:br or self::w:cr or self::w:noBreakHyphen]',
+   namespaces={'w': _W_NS}
+)
+_W_T = f'{{{_W_NS}}}t'
+_W_BR = f'{{{_W_NS}}}br'
+_W_BR_TYPE = f'{{{_W_NS}}}type'
+_RUN_CONTENT_TEXT = {
+   f'{{{_W_NS}}}tab': '\t',
+   f'{{{_W_NS}}}ptab': '\t',
+   f'{{{_W_NS}}}cr': '\n',
+   f'{{{_W_NS}}}noBreakHyphen': '-',
+}
+# Opening <l n="..."> tags indexed by line number, grown on demand and reused
+_LINE_OPEN_TAGS = ['']
+# Extra escapes for verse text in the <l> fragment: a literal CR would be
+# normalised to LF when the fragment is parsed
+_LINE_TEXT_ENTITIES = {'\r': '&#13;'}
+
+
+def _paragraph_text(p_elem: etree._Element) -> str:
+   """Text of a <w:p> element, read directly from its run content
+   
+   Same result as python-docx's Paragraph.text (tabs and line breaks
+   become \\t and \\n) without going through the Paragraph/Run wrappers.
+   """
+   parts = []
+   for elem in _RUN_CONTENT_XPATH(p_elem):
+       tag = elem.tag
+       if tag == _W_T:
+           parts.append(elem.text or '')
+       elif tag == _W_BR:
+           # Only text-wrapping breaks count; page/column breaks are dropped
+           if elem.get(_W_BR_TYPE, 'textWrapping') == 'textWrapping':
+               parts.append('\n')
+       else:
+           parts.append(_RUN_CONTENT_TEXT[tag])
+   return ''.join(parts)
+
+
+def _line_open_tags(count: int) -> List[str]:
+   """Opening <l> tags for line numbers 1..count (index = line number)"""
+   for n in range(len(_LINE_OPEN_TAGS), count + 1):
+       _LINE_OPEN_TAGS.append(f'<l n="{n}">')
+   return _LINE_OPEN_TAGS
+
+
+class _Stats:
+   """Processing counters - plain attributes are cheaper than dict items"""
+   __slots__ = ('books', 'poems', 'lines', 'colophon', 'uncertain', 'praefatio_lines')
+   
+   def __init__(self) -> None:
+       self.books = 0
+       self.poems = 0
+       self.lines = 0
+       self.colophon = 0
+       self.uncertain = 0
+       self.praefatio_lines = 0
+
 
 class LucinaToTEI:
    """Convert Lucina Edition.docx to TEI XML - Final corrected version"""
    
-   def __init__(self, docx_path: str):
+   def __init__(self, docx_path: str) -> None:
        """Initialize with document path"""
        self.doc_path = Path(docx_path)
        logger.info(f"Loading: {self.doc_path.name}")
-       self.doc = Document(docx_path)
        
        # TEI namespace setup
        self.TEI_NS = "http://www.tei-c.org/ns/1.0"
        self.XML_NS = "http://www.w3.org/XML/1998/namespace"
        self.nsmap = {None: self.TEI_NS, 'xml': self.XML_NS}
+       self.XML_ID = etree.QName(self.XML_NS, 'id')  # xml:id key, parsed once
        
        # State tracking
-       self.current_book = None
-       self.current_poem = None
-       self.poems = []
-       self.verse_buffer = []
+       self.current_book: Optional[str] = None
+       self.current_poem: Optional[Dict] = None
+       self.poems: List[Dict] = []
+       self.verse_buffer: List[str] = []
        self.in_praefatio = False
        self.praefatio_lines_seen = 0  # Count actual lines after headers
-       self.stats = defaultdict(int)
-       self.poem_tracker = defaultdict(list)
-       self.unprocessed_lines = []
-       self.colophon_lines = []  # Store colophon separately
-       
-       logger.info(f"Total paragraphs: {len(self.doc.paragraphs)}")
+       self.stats = _Stats()
+       self.unprocessed_lines: List[Tuple[int, str]] = []
+       self.colophon_lines: List[str] = []  # Store colophon separately
    
-   def process(self) -> etree.Element:
+   def process(self) -> etree._Element:
        """Main processing method"""
-       logger.info("="*60)
-       logger.info("Starting final document processing...")
-       logger.info("Fixing Praefatio headers and colophon")
-       logger.info("="*60)
+       self._read_paragraphs()
        
        # Create TEI structure
        tei = etree.Element('TEI', nsmap=self.nsmap)
@@ -62,16 +164,6 @@ class LucinaToTEI:
        body = etree.SubElement(text, 'body')
        back = etree.SubElement(text, 'back')
        
-       # Process all paragraphs
-       for idx, para in enumerate(self.doc.paragraphs):
-           if idx % 100 == 0 and idx > 0:
-               logger.debug(f"Progress: {idx}/{len(self.doc.paragraphs)} paragraphs")
-           self._process_paragraph(para, idx)
-       
-       # Save final poem if exists
-       if self.current_poem and self.verse_buffer:
-           self._save_current_poem()
-       
        # Build TEI structure
        self._build_tei_structure(front, body, back)
        
@@ -80,22 +172,57 @@ class LucinaToTEI:
        
        return tei
    
-   def _process_paragraph(self, para, idx: int):
-       """Process a single paragraph"""
-       text = para.text.strip()
-       if not text:
-           return
+   def _read_paragraphs(self) -> None:
+       """Collect poems, praefatio and colophon from the document"""
+       logger.info("="*60)
+       logger.info("Starting final document processing...")
+       logger.info("Fixing Praefatio headers and colophon")
+       logger.info("="*60)
+       
+       # Process all paragraphs as they are parsed
+       next_progress = 100
+       for idx, p_elem in enumerate(self._iter_paragraphs()):
+           if idx == next_progress:
+               logger.debug("Progress: %d paragraphs", idx)
+               next_progress += 100
+           self._process_paragraph(p_elem, idx)
        
-       # Check for colophon FIRST (before other processing)
-       if self._is_colophon(text):
-           self._handle_colophon(text)
+       # Save final poem if exists
+       self._save_current_poem()
+   
+   def _iter_paragraphs(self) -> Iterator[etree._Element]:
+       """Yield the body-level <w:p> elements of the document
+       
+       document.xml is parsed incrementally from the .docx zip; each
+       paragraph is cleared and dropped once processed, so memory stays
+       bounded regardless of document size. Paragraphs nested in tables
+       are skipped, as with python-docx's Document.paragraphs.
+       """
+       with zipfile.ZipFile(self.doc_path) as docx, docx.open(_DOCUMENT_PART) as xml:
+           for _, p_elem in etree.iterparse(xml, tag=_W_P):
+               body = p_elem.getparent()
+               if body.tag != _W_BODY:
+                   continue
+               yield p_elem
+               p_elem.clear()
+               while p_elem.getprevious() is not None:
+                   del body[0]
+   
+   def _process_paragraph(self, p_elem: etree._Element, idx: int) -> None:
+       """Process a single paragraph (<w:p> element)"""
+       text = _paragraph_text(p_elem).strip()
+       if not text:
            return
        
-       # Check for structural elements
-       if self._is_book_header(text):
-           self._handle_book_header(text)
-       elif self._is_poem_header(text):
-           self._handle_poem_header(text, idx)
+       # Classify once, then dispatch on the result
+       kind, match = self._classify_paragraph(text)
+       if match is not None:
+           if kind == 'colophon':
+               self._handle_colophon(text)
+           elif kind == 'book':
+               self._handle_book_header(text, match)
+           else:
+               self._handle_poem_header(text, match)
        elif self.current_poem is not None:
            # We're in a poem, add as verse line
            self._handle_verse_line(text)
@@ -105,180 +232,146 @@ class LucinaToTEI:
        else:
            # Track what we couldn't process
            self.unprocessed_lines.append((idx, text[:50]))
-           self.stats['uncertain'] += 1
+           self.stats.uncertain += 1
    
-   def _is_colophon(self, text: str) -> bool:
-       """Check if text is a colophon (at end of document)"""
-       return 'Actum Papiae' in text or 'CDiis Immor' in text or 'Quarto Nonas Augustas' in text
+   def _classify_paragraph(self, text: str) -> Tuple[Optional[str], Optional[re.Match]]:
+       """Classify paragraph as colophon, book or poem header in a single pass
+       
+       Returns (kind, match); the poem header match is handed on to
+       _handle_poem_header so the pattern is not run a second time.
+       """
+       # Cheap first-character gate before the pattern runs
+       if text[0] not in _HEADER_FIRST_CHARS:
+           return None, None
+       match = _HEADER_RE.match(text)
+       if match is None:
+           return None, None
+       return match.lastgroup, match
    
-   def _handle_colophon(self, text: str):
+   def _handle_colophon(self, text: str) -> None:
        """Handle colophon - store separately, don't add to poem"""
        self.colophon_lines.append(text)
-       logger.info(f"Found colophon: {text[:50]}...")
-       self.stats['colophon'] += 1
-   
-   def _is_book_header(self, text: str) -> bool:
-       """Check if text is a book header"""
-       if text == "Praefatio":
-           return True
-       if re.match(r'^Buch\s+[IVX]+$', text):
-           return True
-       if re.match(r'^B\[uch\]\s+[IVX]+$', text):
-           return True
-       return False
-   
-   def _is_poem_header(self, text: str) -> bool:
-       """Check if text is a poem header - ALL patterns"""
-       patterns = [
-           # Standard Ad pattern
-           r'^([IVX]+),\s*(\d+)\s+Ad\s+(.+?)\.?$',
-           # In pattern (invectives/epitaphs)
-           r'^([IVX]+),\s*(\d+)\s+In\s+(.+?)\.?$',
-           # No preposition pattern (direct title/name)
-           r'^([IVX]+),\s*(\d+)\s+([A-Z][a-z].+?)\.?$',
-           # Numeric book numbers (if any)
-           r'^(\d+),\s*(\d+)\s+(?:Ad|In)\s+(.+?)\.?$',
-       ]
-       return any(re.match(p, text) for p in patterns)
+       logger.info("Found colophon: %.50s...", text)
+       self.stats.colophon += 1
    
-   def _handle_book_header(self, text: str):
+   def _handle_book_header(self, text: str, match: re.Match) -> None:
        """Process book header"""
        # Save current poem if exists
-       if self.current_poem and self.verse_buffer:
-           self._save_current_poem()
+       self._save_current_poem()
        
-       if text == "Praefatio":
+       book_num = match['book_num']
+       if book_num is None:  # Praefatio
            self.current_book = 'praefatio'
            self.in_praefatio = True
            self.praefatio_lines_seen = 0  # Reset counter
-           self.stats['books'] += 1
+           self.stats.books += 1
            # Create praefatio poem structure
            self.current_poem = {
                'book': 'praefatio',
                'number': '0',
+               'n': 0,
                'type': 'praefatio',
                'lines': []
            }
            self.verse_buffer = []
            logger.info("✓ Found: Praefatio")
            
-       elif "Buch" in text or "B[uch]" in text:
-           # End praefatio if we were in it
-           if self.in_praefatio:
-               self.in_praefatio = False
-               if self.verse_buffer:
-                   self._save_current_poem()
+       else:
+           # End praefatio if we were in it (its lines were saved above)
+           self.in_praefatio = False
            
-           match = re.search(r'[IVX]+', text)
-           if match:
-               self.current_book = match.group()
-               self.stats['books'] += 1
-               logger.info(f"✓ Found: Book {self.current_book}")
+           self.current_book = book_num
+           self.stats.books += 1
+           logger.info("✓ Found: Book %s", self.current_book)
    
-   def _handle_praefatio_content(self, text: str):
+   def _handle_praefatio_content(self, text: str) -> None:
        """Handle content in Praefatio - skip the first two header lines"""
        # Skip the headers: "Aurelii..." and "ad mecoenatem..."
        if 'Aurelii' in text and 'Albrisii' in text and 'praefatio' in text:
-           logger.debug(f"Skipping Praefatio header 1: {text[:50]}")
+           logger.debug("Skipping Praefatio header 1: %.50s", text)
            return
-       if text.lower().startswith('ad mecoenatem') or text.lower().startswith('ad mecoenatum'):
-           logger.debug(f"Skipping Praefatio header 2: {text[:50]}")
+       if text.lower().startswith(('ad mecoenatem', 'ad mecoenatum')):
+           logger.debug("Skipping Praefatio header 2: %.50s", text)
            return
        
        # Now we have actual verse lines
        self.verse_buffer.append(text)
        self.praefatio_lines_seen += 1
-       self.stats['lines'] += 1
-       logger.debug(f"Praefatio line {self.praefatio_lines_seen}: {text[:30]}")
+       logger.debug("Praefatio line %d: %.30s", self.praefatio_lines_seen, text)
    
-   def _handle_poem_header(self, text: str, idx: int):
+   def _handle_poem_header(self, text: str, match: re.Match) -> None:
        """Process poem header - handles all patterns"""
        # Save previous poem
-       if self.current_poem and self.verse_buffer:
-           self._save_current_poem()
+       self._save_current_poem()
        
        # End praefatio state if we hit a poem
        if self.in_praefatio:
            self.in_praefatio = False
        
-       # Try all patterns with their prepositions
-       patterns = [
-           (r'^([IVX]+),\s*(\d+)\s+Ad\s+(.+?)\.?$', 'Ad'),
-           (r'^([IVX]+),\s*(\d+)\s+In\s+(.+?)\.?$', 'In'),
-           (r'^([IVX]+),\s*(\d+)\s+([A-Z][a-z].+?)\.?$', ''),
-           (r'^(\d+),\s*(\d+)\s+(Ad|In)\s+(.+?)\.?$', 'extract'),
-       ]
-       
-       for pattern, prep_type in patterns:
-           match = re.match(pattern, text)
-           if match:
-               # Extract components
-               book = match.group(1)
-               
-               # Convert numeric to Roman if needed
-               if book.isdigit():
-                   book_map = {'1': 'I', '2': 'II', '3': 'III'}
-                   book = book_map.get(book, self.current_book)
-               
-               number = match.group(2)
-               
-               # Handle different pattern structures
-               if prep_type == 'extract':
-                   preposition = match.group(3)
-                   dedicatee = match.group(4).strip()
-               else:
-                   dedicatee = match.group(3).strip() if len(match.groups()) >= 3 else ""
-                   preposition = prep_type
-               
-               # Clean dedicatee - remove any trailing rubric text
-               if 'Aurelius' in dedicatee or 'Albrisii' in dedicatee or 'incipit' in dedicatee:
-                   for keyword in ['Aurelius', 'Albrisii', 'incipit']:
-                       if keyword in dedicatee:
-                           dedicatee = dedicatee.split(keyword)[0].strip()
-                           break
-               
-               # Create poem structure
-               self.current_poem = {
-                   'book': book,
-                   'number': number,
-                   'dedicatee': dedicatee,
-                   'preposition': preposition,
-                   'lines': []
-               }
-               
-               self.verse_buffer = []
-               self.stats['poems'] += 1
-               self.poem_tracker[book].append(number)
-               
-               prep_display = f"{preposition} " if preposition else ""
-               logger.info(f"✓ Found poem: {book}.{number} {prep_display}{dedicatee[:30]}")
-               break
+       # Extract components
+       book = match['roman']
+       if book is None:
+           # Convert numeric to Roman
+           book = _DIGIT_TO_ROMAN.get(match['digits'], self.current_book)
+       
+       number = match['num']
+       preposition = match['prep'] or ''
+       dedicatee = (match['ded'] or match['title']).strip()
+       
+       # Clean dedicatee - remove any trailing rubric text
+       rubric = _TRAILING_RUBRIC_RE.search(dedicatee)
+       if rubric:
+           dedicatee = dedicatee[:rubric.start()].strip()
+       
+       # Create poem structure
+       self.current_poem = {
+           'book': book,
+           'number': number,
+           'n': int(number),  # numeric sort key, parsed once
+           'dedicatee': dedicatee,
+           'preposition': preposition,
+           'lines': []
+       }
+       
+       self.verse_buffer = []
+       self.stats.poems += 1
+       
+       prep_display = f"{preposition} " if preposition else ""
+       logger.info("✓ Found poem: %s.%s %s%.30s", book, number, prep_display, dedicatee)
    
-   def _handle_verse_line(self, text: str):
+   def _handle_verse_line(self, text: str) -> None:
        """Process verse line"""
        if not text:
            return
        
        # Skip rubric-like lines
-       if 'incipit' in text.lower() and 'aurelii' in text.lower():
-           logger.debug(f"Skipping rubric-like line: {text[:50]}")
+       text_lower = text.lower()
+       if 'incipit' in text_lower and 'aurelii' in text_lower:
+           logger.debug("Skipping rubric-like line: %.50s", text)
            return
        
        self.verse_buffer.append(text)
-       self.stats['lines'] += 1
-   
-   def _save_current_poem(self):
-       """Save current poem with its lines"""
-       if self.current_poem and self.verse_buffer:
-           self.current_poem['lines'] = self.verse_buffer.copy()
-           self.poems.append(self.current_poem.copy())
-           self.verse_buffer = []
    
-   def _build_tei_structure(self, front, body, back):
-       """Build TEI XML structure"""
-       logger.info("\nBuilding TEI structure...")
+   def _save_current_poem(self) -> None:
+       """Save current poem with its lines (poems without lines are skipped)"""
+       if not self.verse_buffer:
+           return
+       # Lines are only buffered while a poem (or the Praefatio) is open
+       assert self.current_poem is not None
+       
+       # Every buffered line ends up here, so count them per poem rather
+       # than per line
+       self.stats.lines += len(self.verse_buffer)
        
-       # Separate praefatio from other poems
+       # Hand the buffer and poem dict over instead of copying them;
+       # both are replaced before they are touched again
+       self.current_poem['lines'] = self.verse_buffer
+       self.poems.append(self.current_poem)
+       self.current_poem = None
+       self.verse_buffer = []
+   
+   def _group_poems(self) -> Tuple[Optional[Dict], List[Tuple[str, List[Dict]]]]:
+       """Separate the praefatio from the books, poems sorted per book"""
        books = defaultdict(list)
        praefatio_poem = None
        
@@ -288,44 +381,114 @@ class LucinaToTEI:
            else:
                books[poem['book']].append(poem)
        
+       ordered = []
+       for book_num in _BOOK_INDEX:
+           if book_num in books:
+               poems = books[book_num]
+               poems.sort(key=itemgetter('n'))
+               ordered.append((book_num, poems))
+       return praefatio_poem, ordered
+   
+   def _build_tei_structure(self, front: etree._Element, body: etree._Element, back: etree._Element) -> None:
+       """Build TEI XML structure"""
+       logger.info("\nBuilding TEI structure...")
+       
+       praefatio_poem, books = self._group_poems()
+       
        # Add Praefatio to front matter
        if praefatio_poem:
            self._add_praefatio(front, praefatio_poem)
        
        # Add books to body
-       for book_num in ['I', 'II', 'III']:
-           if book_num in books:
-               book_div = etree.SubElement(body, 'div')
-               book_div.set('type', 'book')
-               book_div.set('n', str(['I', 'II', 'III'].index(book_num) + 1))
-               book_div.set('{%s}id' % self.XML_NS, f'book{book_num}')
-               
-               # Add book heading
-               head = etree.SubElement(book_div, 'head')
-               head.set('type', 'book')
-               head.text = f'Liber {self._roman_to_word(book_num)}'
-               
-               # Sort and add poems
-               sorted_poems = sorted(books[book_num], 
-                                   key=lambda p: int(p['number']))
-               for poem in sorted_poems:
-                   self._add_poem_to_tei(book_div, poem)
-               
-               logger.info(f"  Added Book {book_num}: {len(sorted_poems)} poems")
+       for book_num, sorted_poems in books:
+           book_div = self._add_book_div(body, book_num)
+           for poem in sorted_poems:
+               self._add_poem_to_tei(book_div, poem)
+           
+           logger.info(f"  Added Book {book_num}: {len(sorted_poems)} poems")
        
        # Add colophon to back matter if exists
        if self.colophon_lines:
            self._add_colophon(back)
    
+   def _write_tei_structure(self, xf: 'etree._IncrementalFileWriter', pretty_print: bool = True) -> None:
+       """Stream the TEI structure into an etree.xmlfile writer
+       
+       Produces the same document as process() + tree.write(pretty_print=...),
+       but each book is built, written and dropped on its own instead of
+       keeping the whole body tree in memory until the end. (Books rather
+       than poems: xmlfile.element() cannot emit the reserved xml: prefix
+       for xml:id.)
+       """
+       logger.info("\nBuilding TEI structure...")
+       
+       praefatio_poem, books = self._group_poems()
+       
+       def newline(level: int) -> None:
+           if pretty_print:
+               xf.write('\n' + '  ' * level)
+       
+       front = etree.Element('front')
+       if praefatio_poem:
+           self._add_praefatio(front, praefatio_poem)
+       
+       with xf.element('TEI', nsmap={None: self.TEI_NS}):
+           newline(1)
+           with xf.element('text'):
+               self._write_element(xf, front, 2, pretty_print)
+               
+               body = etree.Element('body')
+               if not books:
+                   self._write_element(xf, body, 2, pretty_print)
+               else:
+                   newline(2)
+                   with xf.element('body'):
+                       for book_num, sorted_poems in books:
+                           book_div = self._add_book_div(body, book_num)
+                           for poem in sorted_poems:
+                               self._add_poem_to_tei(book_div, poem)
+                           body.remove(book_div)
+                           self._write_element(xf, book_div, 3, pretty_print)
+                           
+                           logger.info(f"  Added Book {book_num}: {len(sorted_poems)} poems")
+                       newline(2)
+               
+               back = etree.Element('back')
+               if self.colophon_lines:
+                   self._add_colophon(back)
+               self._write_element(xf, back, 2, pretty_print)
+               newline(1)
+           newline(0)
+   
+   def _write_element(self, xf: 'etree._IncrementalFileWriter', elem: etree._Element, level: int, pretty_print: bool) -> None:
+       """Write a detached element, on its own line at the given depth if pretty"""
+       if pretty_print:
+           xf.write('\n' + '  ' * level)
+           etree.indent(elem, space='  ', level=level)
+       xf.write(elem)
+   
+   def _add_book_div(self, body: etree._Element, book_num: str) -> etree._Element:
+       """Add book division with its heading"""
+       book_div = etree.SubElement(body, 'div')
+       book_div.set('type', 'book')
+       book_div.set('n', _BOOK_INDEX[book_num])
+       book_div.set(self.XML_ID, f'book{book_num}')
+       
+       # Add book heading
+       head = etree.SubElement(book_div, 'head')
+       head.set('type', 'book')
+       head.text = f'Liber {self._roman_to_word(book_num)}'
+       return book_div
+   
    def _roman_to_word(self, roman: str) -> str:
        """Convert Roman numeral to Latin word"""
-       return {'I': 'Primus', 'II': 'Secundus', 'III': 'Tertius'}.get(roman, roman)
+       return _ROMAN_TO_WORD.get(roman, roman)
    
-   def _add_praefatio(self, front, poem):
+   def _add_praefatio(self, front: etree._Element, poem: Dict) -> None:
        """Add praefatio to front matter - with correct line numbering"""
        div = etree.SubElement(front, 'div')
        div.set('type', 'praefatio')
-       div.set('{%s}id' % self.XML_NS, 'praefatio')
+       div.set(self.XML_ID, 'praefatio')
        
        # Simple headers without duplication
        head1 = etree.SubElement(div, 'head')
@@ -338,24 +501,16 @@ class LucinaToTEI:
        
        # Add lines in elegiac couplets - these should be the actual verses only
        lines = poem.get('lines', [])
-       for i in range(0, len(lines), 2):
-           lg = etree.SubElement(div, 'lg')
-           lg.set('type', 'elegiac')
-           
-           for j in range(2):
-               if i + j < len(lines):
-                   l = etree.SubElement(lg, 'l')
-                   l.set('n', str(i + j + 1))  # Correct numbering from 1
-                   l.text = lines[i + j]
+       self._add_line_groups(div, lines, couplets=True)
        
-       self.stats['praefatio_lines'] = len(lines)
+       self.stats.praefatio_lines = len(lines)
    
-   def _add_poem_to_tei(self, book_div, poem):
+   def _add_poem_to_tei(self, book_div: etree._Element, poem: Dict) -> None:
        """Add poem to TEI structure"""
        poem_div = etree.SubElement(book_div, 'div')
        poem_div.set('type', 'poem')
        poem_div.set('n', poem['number'])
-       poem_div.set('{%s}id' % self.XML_NS, f"poem-{poem['book']}.{poem['number']}")
+       poem_div.set(self.XML_ID, f"poem-{poem['book']}.{poem['number']}")
        
        # Add poem number
        head_num = etree.SubElement(poem_div, 'head')
@@ -378,59 +533,44 @@ class LucinaToTEI:
        if lines:
            meter_type = self._detect_meter(poem, lines)
            
-           if meter_type == 'elegiac':
-               # Add lines in elegiac couplets
-               for i in range(0, len(lines), 2):
-                   lg = etree.SubElement(poem_div, 'lg')
-                   lg.set('type', 'elegiac')
-                   
-                   for j in range(2):
-                       if i + j < len(lines):
-                           l = etree.SubElement(lg, 'l')
-                           l.set('n', str(i + j + 1))
-                           l.text = lines[i + j]
-           
-           elif meter_type == 'lyric':
-               # Lyric poems - single lg without type specification
-               lg = etree.SubElement(poem_div, 'lg')
-               for i, line_text in enumerate(lines, 1):
-                   l = etree.SubElement(lg, 'l')
-                   l.set('n', str(i))
-                   l.text = line_text
-           
-           else:
-               # Default: single lg for unknown meters
-               lg = etree.SubElement(poem_div, 'lg')
-               for i, line_text in enumerate(lines, 1):
-                   l = etree.SubElement(lg, 'l')
-                   l.set('n', str(i))
-                   l.text = line_text
+           # Elegiac poems in couplets; lyric poems (and unknown meters)
+           # in a single lg without type specification
+           self._add_line_groups(poem_div, lines, couplets=(meter_type == 'elegiac'))
+   
+   def _add_line_groups(self, parent: etree._Element, lines: List[str], couplets: bool) -> None:
+       """Append verse lines to parent as <lg>/<l> elements
+       
+       The groups are rendered as one XML fragment and parsed in a single
+       call, which is cheaper than creating every <l> via SubElement.
+       """
+       if not lines:
+           return
+       l_open = _line_open_tags(len(lines))
+       rendered = [f'{l_open[n]}{escape(line_text, _LINE_TEXT_ENTITIES)}</l>'
+                   for n, line_text in enumerate(lines, 1)]
+       if couplets:
+           # Pair the rendered lines; an odd last line gets a group of its own
+           pairs = iter(rendered)
+           groups = ''.join([f'<lg type="elegiac">{first}{second}</lg>'
+                             for first, second in zip_longest(pairs, pairs, fillvalue='')])
+       else:
+           groups = f'<lg>{"".join(rendered)}</lg>'
+       parent.extend(list(etree.fromstring(f'<lines>{groups}</lines>')))
    
    def _detect_meter(self, poem: Dict, lines: List[str]) -> str:
        """Detect meter type for a poem"""
-       # Known lyric poems (odd line counts or special meters)
-       lyric_poems = [
-           ('I', '18'),   # 3 lines
-           ('I', '43'),   # 84 lines (sapphic)
-           ('II', '6'),   # 51 lines
-           ('III', '1'),  # 29 lines
-           ('III', '10'), # 39 lines
-           ('III', '36'), # 29 lines (hexameter)
-           ('III', '43'), # 55 lines
-           ('III', '47'), # Multiple lines, lyric
-       ]
-       
-       if (poem['book'], poem['number']) in lyric_poems:
+       # Odd line count = likely lyric; no need to consult _LYRIC_POEMS
+       if len(lines) % 2:
            return 'lyric'
        
-       # Poems with even line count are likely elegiac
-       if len(lines) % 2 == 0:
-           return 'elegiac'
+       # Known lyric poems
+       if (poem['book'], poem['number']) in _LYRIC_POEMS:
+           return 'lyric'
        
-       # Odd line count = likely lyric
-       return 'lyric'
+       # Remaining poems have an even line count and are likely elegiac
+       return 'elegiac'
    
-   def _add_colophon(self, back):
+   def _add_colophon(self, back: etree._Element) -> None:
        """Add colophon to back matter"""
        div = etree.SubElement(back, 'div')
        div.set('type', 'colophon')
@@ -441,43 +581,45 @@ class LucinaToTEI:
        
        logger.info(f"Added colophon with {len(self.colophon_lines)} lines")
    
-   def _report_results(self):
+   def _report_results(self) -> None:
        """Report processing results"""
        logger.info("\n" + "="*60)
        logger.info("PROCESSING COMPLETE:")
        logger.info("="*60)
        
        # Include Praefatio in count
-       total_poems = self.stats['poems']
-       if self.stats.get('praefatio_lines') > 0:
+       total_poems = self.stats.poems
+       if self.stats.praefatio_lines > 0:
            total_poems += 1
        
        logger.info(f"✓ Successfully processed:")
-       logger.info(f"  - Books: {self.stats['books']}")
+       logger.info(f"  - Books: {self.stats.books}")
        logger.info(f"  - Poems: {total_poems} (including Praefatio)")
-       logger.info(f"  - Lines: {self.stats['lines']}")
-       logger.info(f"  - Colophon sections: {self.stats['colophon']}")
+       logger.info(f"  - Lines: {self.stats.lines}")
+       logger.info(f"  - Colophon sections: {self.stats.colophon}")
        
-       if self.stats.get('praefatio_lines'):
-           logger.info(f"  - Praefatio lines: {self.stats['praefatio_lines']}")
-           if self.stats['praefatio_lines'] == 16:
+       if self.stats.praefatio_lines:
+           logger.info(f"  - Praefatio lines: {self.stats.praefatio_lines}")
+           if self.stats.praefatio_lines == 16:
                logger.info("    ✓ Praefatio has correct 16 lines!")
            else:
-               logger.warning(f"    ⚠ Praefatio has {self.stats['praefatio_lines']} lines (expected 16)")
+               logger.warning(f"    ⚠ Praefatio has {self.stats.praefatio_lines} lines (expected 16)")
+       
+       # Report poems per book, from the collected poems
+       numbers_by_book = defaultdict(list)
+       for poem in self.poems:
+           numbers_by_book[poem['book']].append(poem['n'])
        
-       # Report poems per book
        for book in ['I', 'II', 'III']:
-           if book in self.poem_tracker:
-               logger.info(f"\nBook {book}: {len(self.poem_tracker[book])} poems")
-               numbers = sorted([int(n) for n in self.poem_tracker[book]])
+           if book in numbers_by_book:
+               numbers = numbers_by_book[book]
+               logger.info(f"\nBook {book}: {len(numbers)} poems")
                
                # Check for gaps
-               if numbers:
-                   expected = set(range(1, max(numbers) + 1))
-                   found = set(numbers)
-                   missing = expected - found
-                   if missing:
-                       logger.warning(f"  Missing numbers: {sorted(missing)}")
+               found = set(numbers)
+               missing = [n for n in range(1, max(numbers) + 1) if n not in found]
+               if missing:
+                   logger.warning(f"  Missing numbers: {missing}")
        
        if self.unprocessed_lines:
            logger.info(f"\n✗ Unprocessed lines: {len(self.unprocessed_lines)}")
@@ -492,24 +634,33 @@ class LucinaToTEI:
        capture_rate = (total_poems / expected_total) * 100 if expected_total > 0 else 0
        logger.info(f"Capture rate: {total_poems}/{expected_total} poems ({capture_rate:.1f}%)")
    
-   def save_tei(self, output_path: str):
-       """Save TEI XML to file"""
-       tei = self.process()
-       tree = etree.ElementTree(tei)
+   def save_tei(self, output_path: str, pretty_print: bool = True) -> Path:
+       """Save TEI XML to file
+       
+       The document is streamed with etree.xmlfile, so only one book at a
+       time is held as a tree; the output matches process() written with
+       tree.write(). pretty_print stays on by default since the edition
+       files are read and diffed by hand; pass False for compact output
+       when converting large documents.
+       """
+       self._read_paragraphs()
        
        output = Path(output_path)
-       tree.write(
-           str(output),
-           pretty_print=True,
-           xml_declaration=True,
-           encoding='UTF-8'
-       )
+       with open(output, 'wb') as f:
+           with etree.xmlfile(f, encoding='UTF-8') as xf:
+               xf.write_declaration()
+               self._write_tei_structure(xf, pretty_print)
+           if pretty_print:
+               # xmlfile cannot write text after the root element
+               f.write(b'\n')
+       
+       # Report results
+       self._report_results()
        
        logger.info(f"\nSaved: {output.name}")
        return output
 
-
-def main():
+def main() -> None:
    """Main execution"""
    import sys
    
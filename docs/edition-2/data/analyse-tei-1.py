@@ -1,22 +1,61 @@
-import xml.etree.ElementTree as ET
+from lxml import etree
 from collections import defaultdict, Counter
 import os
 from typing import Dict, List, Set, Tuple
 
+TEI_NS = 'http://www.tei-c.org/ns/1.0'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+# Clark-notation tag names matched during the streaming pass
+TEI_DIV = f'{{{TEI_NS}}}div'
+TEI_L = f'{{{TEI_NS}}}l'
+TEI_LG = f'{{{TEI_NS}}}lg'
+TEI_PERSNAME = f'{{{TEI_NS}}}persName'
+TEI_PERSON = f'{{{TEI_NS}}}person'
+TEI_STANDOFF = f'{{{TEI_NS}}}standOff'
+TEI_NOTE = f'{{{TEI_NS}}}note'
+TEI_APP = f'{{{TEI_NS}}}app'
+TEI_Q = f'{{{TEI_NS}}}q'
+
+# Latin verbs that introduce direct speech
+SPEECH_VERBS = ('inquit', 'ait', 'dixit', 'diceret', 'respondit', 'exclamat', 'clamat')
+
 class TEIAnalyzer:
     def __init__(self, filepath: str):
         """Initialize the TEI analyzer with the XML file."""
-        self.tree = ET.parse(filepath)
-        self.root = self.tree.getroot()
+        self.filepath = filepath
         
-        # Define TEI namespace
-        self.ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
+        # Results of analyze_all(), filled on first use
+        self._results = None
+    
+    def _iter_events(self, chunk_size: int = 64 * 1024):
+        """Yield (event, element) pairs for every start and end tag.
+        
+        iterparse() ignores collect_ids and rejects any xml:id that is not
+        an NCName, so the file is fed to a pull parser in chunks instead.
+        """
+        parser = etree.XMLPullParser(events=('start', 'end'), collect_ids=False)
+        with open(self.filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                parser.feed(chunk)
+                yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+    
+    def analyze_all(self) -> Dict:
+        """Run every analysis in a single streaming pass over the file.
         
-        # Register namespace for cleaner output
-        ET.register_namespace('', 'http://www.tei-c.org/ns/1.0')
+        The document is read with a pull parser instead of being searched once
+        per analysis; elements are cleared as soon as their text is no
+        longer needed, so only the currently open branch stays in memory.
+        
+        The result is computed once per analyzer and shared by every
+        analyze_* call, so callers must treat the returned dicts as
+        read-only.
+        """
+        if self._results is not None:
+            return self._results
         
-    def analyze_structure(self) -> Dict:
-        """Analyze the document structure."""
         structure = {
             'total_books': 0,
             'total_poems': 0,
@@ -25,73 +64,12 @@ class TEIAnalyzer:
             'lines_per_poem': {},
             'line_groups_per_poem': {}
         }
-        
-        # Find all books
-        books = self.root.findall('.//tei:div[@type="book"]', self.ns)
-        structure['total_books'] = len(books)
-        
-        for book in books:
-            book_id = book.get('{http://www.w3.org/XML/1998/namespace}id', 'unknown')
-            book_num = book.get('n', 'unknown')
-            
-            # Find poems in this book
-            poems = book.findall('.//tei:div[@type="poem"]', self.ns)
-            structure['poems_per_book'][f"Book {book_num}"] = len(poems)
-            
-            for poem in poems:
-                poem_id = poem.get('{http://www.w3.org/XML/1998/namespace}id', 'unknown')
-                
-                # Count lines
-                lines = poem.findall('.//tei:l', self.ns)
-                structure['lines_per_poem'][poem_id] = len(lines)
-                structure['total_lines'] += len(lines)
-                
-                # Count line groups
-                lgs = poem.findall('.//tei:lg', self.ns)
-                structure['line_groups_per_poem'][poem_id] = len(lgs)
-            
-            structure['total_poems'] += len(poems)
-        
-        # Add praefatio if it exists
-        praef = self.root.find('.//tei:div[@type="praefatio"]', self.ns)
-        if praef is not None:
-            praef_lines = praef.findall('.//tei:l', self.ns)
-            structure['praefatio_lines'] = len(praef_lines)
-            structure['total_lines'] += len(praef_lines)
-        
-        return structure
-    
-    def analyze_meters(self) -> Dict:
-        """Analyze metrical patterns in the text."""
         meters = {
             'meter_types': Counter(),
             'poems_by_meter': defaultdict(list),
             'poems_without_meter': [],
             'line_groups_by_type': Counter()
         }
-        
-        # Analyze poems
-        poems = self.root.findall('.//tei:div[@type="poem"]', self.ns)
-        for poem in poems:
-            poem_id = poem.get('{http://www.w3.org/XML/1998/namespace}id', 'unknown')
-            meter = poem.get('met')
-            
-            if meter:
-                meters['meter_types'][meter] += 1
-                meters['poems_by_meter'][meter].append(poem_id)
-            else:
-                meters['poems_without_meter'].append(poem_id)
-        
-        # Analyze line groups
-        lgs = self.root.findall('.//tei:lg', self.ns)
-        for lg in lgs:
-            lg_type = lg.get('type', 'unspecified')
-            meters['line_groups_by_type'][lg_type] += 1
-        
-        return meters
-    
-    def analyze_persons(self) -> Dict:
-        """Analyze personal names and references."""
         persons = {
             'total_persname_tags': 0,
             'unique_persons_referenced': set(),
@@ -100,137 +78,23 @@ class TEIAnalyzer:
             'persons_in_standoff': set(),
             'missing_from_standoff': set()
         }
-        
-        # Find all persName tags
-        persnames = self.root.findall('.//tei:persName', self.ns)
-        persons['total_persname_tags'] = len(persnames)
-        
-        for persname in persnames:
-            ref = persname.get('ref')
-            text = ''.join(persname.itertext()).strip()
-            
-            if ref:
-                # Remove # from ref
-                person_id = ref.lstrip('#')
-                persons['unique_persons_referenced'].add(person_id)
-                persons['person_frequency'][person_id] += 1
-            else:
-                persons['persons_without_ref'].append(text)
-        
-        # Check standOff section
-        standoff_persons = self.root.findall('.//tei:standOff//tei:person', self.ns)
-        for person in standoff_persons:
-            person_id = person.get('{http://www.w3.org/XML/1998/namespace}id')
-            if person_id:
-                persons['persons_in_standoff'].add(person_id)
-        
-        # Find missing persons
-        persons['missing_from_standoff'] = persons['unique_persons_referenced'] - persons['persons_in_standoff']
-        
-        return persons
-    
-    def analyze_quotations(self) -> Dict:
-        """Analyze potential quotations and parenthetical text."""
         quotations = {
             'lines_with_quotes': [],
             'lines_with_parentheses': [],
             'lines_with_speech_verbs': [],
             'potential_direct_speech': []
         }
-        
-        speech_verbs = ['inquit', 'ait', 'dixit', 'diceret', 'respondit', 'exclamat', 'clamat']
-        
-        lines = self.root.findall('.//tei:l', self.ns)
-        for line in lines:
-            line_id = line.get('{http://www.w3.org/XML/1998/namespace}id', 'unknown')
-            text = ''.join(line.itertext())
-            
-            # Check for quotation marks
-            if '"' in text or '«' in text or '»' in text:
-                quotations['lines_with_quotes'].append((line_id, text))
-                quotations['potential_direct_speech'].append(line_id)
-            
-            # Check for parentheses
-            if '(' in text and ')' in text:
-                quotations['lines_with_parentheses'].append((line_id, text))
-            
-            # Check for speech verbs
-            text_lower = text.lower()
-            for verb in speech_verbs:
-                if verb in text_lower:
-                    quotations['lines_with_speech_verbs'].append((line_id, text))
-                    if line_id not in quotations['potential_direct_speech']:
-                        quotations['potential_direct_speech'].append(line_id)
-                    break
-        
-        return quotations
-    
-    def analyze_indentation(self) -> Dict:
-        """Analyze line indentation in elegiac poems."""
         indentation = {
             'elegiac_poems': [],
             'lines_needing_indent': [],
             'lines_already_indented': [],
             'inconsistent_poems': []
         }
-        
-        # Find elegiac poems
-        elegiac_poems = self.root.findall('.//tei:div[@type="poem"][@met="elegiac"]', self.ns)
-        
-        for poem in elegiac_poems:
-            poem_id = poem.get('{http://www.w3.org/XML/1998/namespace}id')
-            indentation['elegiac_poems'].append(poem_id)
-            
-            lines = poem.findall('.//tei:l', self.ns)
-            needs_indent = []
-            has_indent = []
-            
-            for i, line in enumerate(lines, 1):
-                line_id = line.get('{http://www.w3.org/XML/1998/namespace}id')
-                rend = line.get('rend')
-                
-                # Even lines should be indented (pentameters)
-                if i % 2 == 0:
-                    if rend == 'indent':
-                        has_indent.append(line_id)
-                    else:
-                        needs_indent.append(line_id)
-                        indentation['lines_needing_indent'].append(line_id)
-            
-            # Check for inconsistency
-            if needs_indent and has_indent:
-                indentation['inconsistent_poems'].append(poem_id)
-        
-        return indentation
-    
-    def analyze_genres(self) -> Dict:
-        """Analyze genre classifications."""
         genres = {
             'genre_distribution': Counter(),
             'poems_without_genre': [],
             'multi_genre_poems': []
         }
-        
-        poems = self.root.findall('.//tei:div[@type="poem"]', self.ns)
-        for poem in poems:
-            poem_id = poem.get('{http://www.w3.org/XML/1998/namespace}id')
-            ana = poem.get('ana')
-            
-            if ana:
-                # Handle multiple genres
-                genre_list = ana.strip().split()
-                for genre in genre_list:
-                    genres['genre_distribution'][genre] += 1
-                
-                if len(genre_list) > 1:
-                    genres['multi_genre_poems'].append((poem_id, genre_list))
-            else:
-                genres['poems_without_genre'].append(poem_id)
-        
-        return genres
-    
-    def analyze_notes_apparatus(self) -> Dict:
-        """Analyze editorial notes and apparatus."""
         apparatus = {
             'total_notes': 0,
             'notes_by_type': Counter(),
@@ -239,35 +103,245 @@ class TEIAnalyzer:
             'poems_without_notes': []
         }
         
-        # Find all notes
-        notes = self.root.findall('.//tei:note', self.ns)
-        apparatus['total_notes'] = len(notes)
-        
-        for note in notes:
-            note_type = note.get('type', 'untyped')
-            apparatus['notes_by_type'][note_type] += 1
+        book_stack = []    # open books: [n, poem count]
+        poem_stack = []    # open poems, innermost last
+        poem_ids = []      # every poem's xml:id in document order
+        speech_seen = set()  # ids already in potential_direct_speech
+        praefatio = None   # first praefatio div
+        in_praefatio = False
+        praefatio_lines = 0
+        in_standoff = 0
+        text_depth = 0     # open <l>/<persName> whose text is still needed
+        
+        for event, elem in self._iter_events():
+            tag = elem.tag
+            
+            if event == 'start':
+                if tag == TEI_L:
+                    text_depth += 1
+                    if in_praefatio:
+                        praefatio_lines += 1
+                    line_id = elem.get(XML_ID)
+                    for poem in poem_stack:
+                        poem['lines'] += 1
+                        # Even lines of elegiac poems should be indented (pentameters)
+                        if poem['elegiac'] and poem['lines'] % 2 == 0:
+                            if elem.get('rend') == 'indent':
+                                poem['has_indent'] = True
+                            else:
+                                poem['needs_indent'] = True
+                                indentation['lines_needing_indent'].append(line_id)
+                
+                elif tag == TEI_LG:
+                    meters['line_groups_by_type'][elem.get('type', 'unspecified')] += 1
+                    for poem in poem_stack:
+                        poem['lgs'] += 1
+                
+                elif tag == TEI_PERSNAME:
+                    text_depth += 1
+                
+                elif tag == TEI_DIV:
+                    div_type = elem.get('type')
+                    if div_type == 'poem':
+                        poem_id = elem.get(XML_ID)
+                        poem_key = poem_id if poem_id is not None else 'unknown'
+                        poem_ids.append(poem_id)
+                        for book in book_stack:
+                            book[1] += 1
+                        
+                        meter = elem.get('met')
+                        if meter:
+                            meters['poems_by_meter'][meter].append(poem_key)
+                        else:
+                            meters['poems_without_meter'].append(poem_key)
+                        
+                        elegiac = meter == 'elegiac'
+                        if elegiac:
+                            indentation['elegiac_poems'].append(poem_id)
+                        
+                        ana = elem.get('ana')
+                        if ana:
+                            # Handle multiple genres
+                            genre_list = ana.strip().split()
+                            genres['genre_distribution'].update(genre_list)
+                            
+                            if len(genre_list) > 1:
+                                genres['multi_genre_poems'].append((poem_id, genre_list))
+                        else:
+                            genres['poems_without_genre'].append(poem_id)
+                        
+                        poem_stack.append({
+                            'id': poem_id,
+                            'key': poem_key,
+                            'books': len(book_stack),  # enclosing books
+                            'lines': 0,
+                            'lgs': 0,
+                            'elegiac': elegiac,
+                            'needs_indent': False,
+                            'has_indent': False
+                        })
+                    elif div_type == 'book':
+                        book_num = elem.get('n', 'unknown')
+                        structure['total_books'] += 1
+                        structure['poems_per_book'][f"Book {book_num}"] = 0
+                        book_stack.append([book_num, 0])
+                    elif div_type == 'praefatio' and praefatio is None:
+                        praefatio = elem
+                        in_praefatio = True
+                
+                elif tag == TEI_NOTE:
+                    apparatus['total_notes'] += 1
+                    apparatus['notes_by_type'][elem.get('type', 'untyped')] += 1
+                    # Nearest enclosing poem
+                    if poem_stack:
+                        apparatus['poems_with_notes'].add(poem_stack[-1]['id'])
+                
+                elif tag == TEI_APP:
+                    apparatus['app_elements'] += 1
+                
+                elif tag == TEI_STANDOFF:
+                    in_standoff += 1
+                
+                elif tag == TEI_PERSON and in_standoff:
+                    person_id = elem.get(XML_ID)
+                    if person_id:
+                        persons['persons_in_standoff'].add(person_id)
+                
+                continue
+            
+            # End events
+            if tag == TEI_L:
+                text_depth -= 1
+                # Lines almost always carry an id; attrib[] is cheaper than get()
+                try:
+                    line_id = elem.attrib[XML_ID]
+                except KeyError:
+                    line_id = 'unknown'
+                if len(elem) and next(elem.iter(TEI_Q), None) is not None:
+                    # Speech is already marked up; don't guess from the text
+                    if line_id not in speech_seen:
+                        quotations['potential_direct_speech'].append(line_id)
+                        speech_seen.add(line_id)
+                else:
+                    # Most lines are plain text; only walk descendants when tagged
+                    text = ''.join(elem.itertext()) if len(elem) else (elem.text or '')
+                    
+                    # Check for quotation marks
+                    if '"' in text or '«' in text or '»' in text:
+                        quotations['lines_with_quotes'].append((line_id, text))
+                        quotations['potential_direct_speech'].append(line_id)
+                        speech_seen.add(line_id)
+                    
+                    # Check for parentheses
+                    if '(' in text and ')' in text:
+                        quotations['lines_with_parentheses'].append((line_id, text))
+                    
+                    # Check for speech verbs
+                    text_lower = text.lower()
+                    for verb in SPEECH_VERBS:
+                        if verb in text_lower:
+                            quotations['lines_with_speech_verbs'].append((line_id, text))
+                            if line_id not in speech_seen:
+                                quotations['potential_direct_speech'].append(line_id)
+                                speech_seen.add(line_id)
+                            break
+            
+            elif tag == TEI_PERSNAME:
+                text_depth -= 1
+                persons['total_persname_tags'] += 1
+                ref = elem.get('ref')
+                if ref:
+                    # Remove # from ref
+                    person_id = ref.lstrip('#')
+                    persons['unique_persons_referenced'].add(person_id)
+                    persons['person_frequency'][person_id] += 1
+                else:
+                    name = ''.join(elem.itertext()) if len(elem) else (elem.text or '')
+                    persons['persons_without_ref'].append(name.strip())
+            
+            elif tag == TEI_DIV:
+                div_type = elem.get('type')
+                if div_type == 'poem':
+                    poem = poem_stack.pop()
+                    if poem['books']:
+                        structure['lines_per_poem'][poem['key']] = poem['lines']
+                        structure['line_groups_per_poem'][poem['key']] = poem['lgs']
+                        structure['total_lines'] += poem['lines'] * poem['books']
+                    # Check for inconsistency
+                    if poem['needs_indent'] and poem['has_indent']:
+                        indentation['inconsistent_poems'].append(poem['id'])
+                elif div_type == 'book':
+                    book_num, poem_count = book_stack.pop()
+                    structure['poems_per_book'][f"Book {book_num}"] = poem_count
+                    structure['total_poems'] += poem_count
+                elif in_praefatio and elem is praefatio:
+                    structure['praefatio_lines'] = praefatio_lines
+                    structure['total_lines'] += praefatio_lines
+                    in_praefatio = False
+            
+            elif tag == TEI_STANDOFF:
+                in_standoff -= 1
             
-            # Find parent poem
-            parent = note
-            while parent is not None:
-                if parent.tag.endswith('div') and parent.get('type') == 'poem':
-                    poem_id = parent.get('{http://www.w3.org/XML/1998/namespace}id')
-                    apparatus['poems_with_notes'].add(poem_id)
-                    break
-                parent = parent.find('..')
-        
-        # Find apparatus entries
-        apps = self.root.findall('.//tei:app', self.ns)
-        apparatus['app_elements'] = len(apps)
+            # Release finished elements unless an open <l>/<persName> still
+            # needs their text. The root has no parent, and its previous
+            # siblings are prolog comments or PIs that cannot be deleted
+            if text_depth == 0:
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+        
+        # Count meters from the poems collected per meter
+        meters['meter_types'] = Counter({meter: len(poem_list)
+                                         for meter, poem_list in meters['poems_by_meter'].items()})
+        
+        # Find missing persons
+        persons['missing_from_standoff'] = persons['unique_persons_referenced'] - persons['persons_in_standoff']
         
         # Find poems without notes
-        all_poems = self.root.findall('.//tei:div[@type="poem"]', self.ns)
-        for poem in all_poems:
-            poem_id = poem.get('{http://www.w3.org/XML/1998/namespace}id')
+        for poem_id in poem_ids:
             if poem_id not in apparatus['poems_with_notes']:
                 apparatus['poems_without_notes'].append(poem_id)
         
-        return apparatus
+        self._results = {
+            'structure': structure,
+            'meters': meters,
+            'persons': persons,
+            'quotations': quotations,
+            'indentation': indentation,
+            'genres': genres,
+            'apparatus': apparatus
+        }
+        return self._results
+    
+    def analyze_structure(self) -> Dict:
+        """Analyze the document structure."""
+        return self.analyze_all()['structure']
+    
+    def analyze_meters(self) -> Dict:
+        """Analyze metrical patterns in the text."""
+        return self.analyze_all()['meters']
+    
+    def analyze_persons(self) -> Dict:
+        """Analyze personal names and references."""
+        return self.analyze_all()['persons']
+    
+    def analyze_quotations(self) -> Dict:
+        """Analyze potential quotations and parenthetical text."""
+        return self.analyze_all()['quotations']
+    
+    def analyze_indentation(self) -> Dict:
+        """Analyze line indentation in elegiac poems."""
+        return self.analyze_all()['indentation']
+    
+    def analyze_genres(self) -> Dict:
+        """Analyze genre classifications."""
+        return self.analyze_all()['genres']
+    
+    def analyze_notes_apparatus(self) -> Dict:
+        """Analyze editorial notes and apparatus."""
+        return self.analyze_all()['apparatus']
     
     def generate_report(self) -> str:
         """Generate a comprehensive analysis report."""
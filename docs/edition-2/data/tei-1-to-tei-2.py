@@ -1,20 +1,39 @@
-import xml.etree.ElementTree as ET
+from lxml import etree
+import copy
 import json
+import re
 from typing import List, Tuple, Dict
 
+TEI_NS = 'http://www.tei-c.org/ns/1.0'
+
+# First opening parenthesis up to the next closing one
+PAREN_RE = re.compile(r'\([^)]*\)')
+
+# Skeleton of a generated standOff entry, copied once per missing person
+PERSON_TEMPLATE = etree.fromstring(f'<person xmlns="{TEI_NS}"><persName/><note/></person>')
+
 class TEIEnricher:
+    # Compiled once; the phases below only read their results
+    _xp_lines = etree.XPath('.//tei:l', namespaces={'tei': TEI_NS})
+    _xp_persnames = etree.XPath('.//tei:persName', namespaces={'tei': TEI_NS})
+    _xp_standoff_persons = etree.XPath('.//tei:standOff//tei:person', namespaces={'tei': TEI_NS})
+    
     def __init__(self, input_file: str, output_file: str):
         """Initialize the enricher with input and output files."""
         self.input_file = input_file
         self.output_file = output_file
-        self.tree = ET.parse(input_file)
+        # Comments and PIs are dropped, as ElementTree did, to keep the output unchanged
+        parser = etree.XMLParser(remove_comments=True, remove_pis=True, collect_ids=False)
+        self.tree = etree.parse(input_file, parser)
         self.root = self.tree.getroot()
         
         # Define TEI namespace
-        self.ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
+        self.ns = {'tei': TEI_NS}
         
-        # Register namespace for cleaner output
-        ET.register_namespace('', 'http://www.tei-c.org/ns/1.0')
+        # The phases add seg, said and @ref but never new <l> or text
+        # persNames, so both lists are looked up once and shared
+        self.lines = self._xp_lines(self.root)
+        self.persnames = self._xp_persnames(self.root)
         
         # Track changes made
         self.changes = {
@@ -34,46 +53,40 @@ class TEIEnricher:
         """Find and mark parenthetical text with <seg type='parenthesis'>."""
         print("\n📝 Marking parenthetical text...")
         
-        lines = self.root.findall('.//tei:l', self.ns)
-        
-        for line in lines:
+        for line in self.lines:
             line_id = line.get('{http://www.w3.org/XML/1998/namespace}id')
             
             # Check if line has text with parentheses
             text_content = ''.join(line.itertext())
             
-            if '(' in text_content and ')' in text_content:
-                # Find all parenthetical content
-                start_idx = text_content.find('(')
-                end_idx = text_content.find(')', start_idx)
+            if '(' not in text_content:
+                continue
+            
+            match = PAREN_RE.search(text_content)
+            if match:
+                start_idx, end_idx = match.start(), match.end() - 1
                 
-                if start_idx != -1 and end_idx != -1:
-                    parenthetical_text = text_content[start_idx:end_idx+1]
-                    
-                    # Log the change
-                    self.change_log.append({
-                        'type': 'parenthetical',
-                        'line_id': line_id,
-                        'text': parenthetical_text,
-                        'full_line': text_content
-                    })
-                    
-                    # Process the line to add seg element
-                    self._wrap_parenthetical_in_line(line, start_idx, end_idx)
-                    self.changes['parentheticals_marked'] += 1
+                # Log the change
+                self.change_log.append({
+                    'type': 'parenthetical',
+                    'line_id': line_id,
+                    'text': match.group(),
+                    'full_line': text_content
+                })
+                
+                # Process the line to add seg element
+                self._wrap_parenthetical_in_line(line, text_content, start_idx, end_idx)
+                self.changes['parentheticals_marked'] += 1
         
         print(f"   ✓ Marked {self.changes['parentheticals_marked']} parenthetical passages")
     
-    def _wrap_parenthetical_in_line(self, line, start_pos, end_pos):
+    def _wrap_parenthetical_in_line(self, line, full_text: str, start_pos, end_pos):
         """Wrap parenthetical text in seg element within a line."""
-        # Get full text
-        full_text = ''.join(line.itertext())
-        
         # Clear line content
         line.text = full_text[:start_pos]
         
         # Create seg element for parenthetical
-        seg = ET.SubElement(line, 'seg')
+        seg = etree.SubElement(line, f'{{{TEI_NS}}}seg')
         seg.set('type', 'parenthesis')
         seg.text = full_text[start_pos:end_pos+1]
         seg.tail = full_text[end_pos+1:]
@@ -84,17 +97,14 @@ class TEIEnricher:
         
         # First, collect all person references in the text
         person_refs = set()
-        persnames = self.root.findall('.//tei:persName[@ref]', self.ns)
-        
-        for persname in persnames:
+        for persname in self.persnames:
             ref = persname.get('ref')
             if ref and ref.startswith('#'):
                 person_refs.add(ref[1:])  # Remove the #
         
         # Find existing persons in standOff
         existing_persons = set()
-        standoff_persons = self.root.findall('.//tei:standOff//tei:person', self.ns)
-        for person in standoff_persons:
+        for person in self._xp_standoff_persons(self.root):
             person_id = person.get('{http://www.w3.org/XML/1998/namespace}id')
             if person_id:
                 existing_persons.add(person_id)
@@ -117,31 +127,30 @@ class TEIEnricher:
                 tei_children = list(parent)
                 header_index = tei_children.index(teiheader)
                 
-                standoff = ET.Element('standOff')
+                standoff = etree.Element(f'{{{TEI_NS}}}standOff')
                 parent.insert(header_index + 1, standoff)
         
         # Find or create listPerson
         listperson = standoff.find('.//tei:listPerson', self.ns)
         if listperson is None:
-            listperson = ET.SubElement(standoff, 'listPerson')
+            listperson = etree.SubElement(standoff, f'{{{TEI_NS}}}listPerson')
         
         # Add missing persons with basic structure
         for person_id in sorted(missing_persons):
             # Create person entry
-            person = ET.SubElement(listperson, 'person')
+            person = copy.deepcopy(PERSON_TEMPLATE)
             person.set('{http://www.w3.org/XML/1998/namespace}id', person_id)
-            
-            # Add persName with formatted name
-            persname = ET.SubElement(person, 'persName')
+            persname, note = person
             
             # Convert ID to readable name
             name = self._format_person_name(person_id)
             persname.text = name
             
             # Add placeholder note
-            note = ET.SubElement(person, 'note')
             note.text = f"[To be completed: biographical information for {name}]"
             
+            listperson.append(person)
+            
             self.changes['persons_added_to_standoff'] += 1
             
             # Log the addition
@@ -183,20 +192,25 @@ class TEIEnricher:
             'aiebat', 'dixerat', 'dicens', 'locutus', 'fatur'
         ]
         
-        lines = self.root.findall('.//tei:l', self.ns)
+        lines = self.lines
+        
+        # Each line is read as itself and as the next line of its
+        # predecessor; join and lowercase it only once
+        texts = [''.join(line.itertext()) for line in lines]
+        texts_lower = [text.lower() for text in texts]
         
         for i, line in enumerate(lines):
             line_id = line.get('{http://www.w3.org/XML/1998/namespace}id')
-            text = ''.join(line.itertext())
-            text_lower = text.lower()
+            text = texts[i]
+            text_lower = texts_lower[i]
             
             # Check for speech verbs
             found_verb = None
             verb_position = -1
             
             for verb in speech_verbs:
-                if verb in text_lower:
-                    verb_position = text_lower.find(verb)
+                verb_position = text_lower.find(verb)
+                if verb_position != -1:
                     found_verb = verb
                     break
             
@@ -211,16 +225,16 @@ class TEIEnricher:
                     potential_speech = text[colon_pos+1:].strip()
                     if potential_speech:
                         speech_content = potential_speech
-                        self._mark_speech_with_said(line, speech_content, colon_pos+1)
+                        self._mark_speech_with_said(line, text, speech_content, colon_pos+1)
                         self.changes['direct_speech_marked'] += 1
                 
                 # Pattern 2: Check if next line might be speech (capital letter start)
                 elif i + 1 < len(lines):
-                    next_line = lines[i + 1]
-                    next_text = ''.join(next_line.itertext()).strip()
+                    next_text = texts[i + 1].strip()
                     # If next line starts with capital and doesn't have speech verb
                     if next_text and next_text[0].isupper():
-                        has_verb = any(v in next_text.lower() for v in speech_verbs)
+                        next_lower = texts_lower[i + 1]
+                        has_verb = any(v in next_lower for v in speech_verbs)
                         if not has_verb:
                             # Mark for manual review
                             self.speech_review_needed.append({
@@ -259,12 +273,10 @@ class TEIEnricher:
         if self.speech_review_needed:
             print(f"   ⚠️  {len(self.speech_review_needed)} lines need manual review for speech")
     
-    def _mark_speech_with_said(self, line, speech_text: str, start_pos: int):
+    def _mark_speech_with_said(self, line, full_text: str, speech_text: str, start_pos: int):
         """Mark speech content with <said> element."""
-        full_text = ''.join(line.itertext())
-        
         # Create said element
-        said = ET.Element('said')
+        said = etree.Element(f'{{{TEI_NS}}}said')
         said.set('rend', 'quoted')
         said.text = speech_text
         
@@ -282,16 +294,14 @@ class TEIEnricher:
         name_to_id = {}
         
         # First pass: collect all persNames with refs
-        persnames_with_ref = self.root.findall('.//tei:persName[@ref]', self.ns)
-        for persname in persnames_with_ref:
-            text = ''.join(persname.itertext()).strip()
+        for persname in self.persnames:
             ref = persname.get('ref')
             if ref and ref.startswith('#'):
+                text = ''.join(persname.itertext()).strip()
                 name_to_id[text.lower()] = ref
         
         # Second pass: find persNames without refs
-        all_persnames = self.root.findall('.//tei:persName', self.ns)
-        for persname in all_persnames:
+        for persname in self.persnames:
             if not persname.get('ref'):
                 text = ''.join(persname.itertext()).strip()
                 text_lower = text.lower()
@@ -396,7 +406,8 @@ class TEIEnricher:
     def save_enhanced_xml(self):
         """Save the enhanced XML to file."""
         # Format the XML nicely
-        self.indent_xml(self.root)
+        etree.indent(self.tree, space="  ")
+        self.root.tail = "\n"  # end the file with a newline
         
         # Write to file with the correct output filename
         self.tree.write(self.output_file, encoding='utf-8', xml_declaration=True)
@@ -415,22 +426,6 @@ class TEIEnricher:
             json.dump(log_data, f, indent=2, ensure_ascii=False)
         print(f"📄 Detailed change log saved to: enhancement_changes.json")
     
-    def indent_xml(self, elem, level=0):
-        """Add pretty printing to XML."""
-        indent = "\n" + "  " * level
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = indent + "  "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = indent
-            for child in elem:
-                self.indent_xml(child, level + 1)
-            if not child.tail or not child.tail.strip():
-                child.tail = indent
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = indent
-    
     def run_phase1_enhancements(self):
         """Run all Phase 1 automatic enhancements."""
         print("\n🚀 Starting TEI Enhancement Process - PHASE 1")